@@ -1,3 +1,12 @@
 import setuptools
 
-setuptools.setup()
\ No newline at end of file
+# The api parsers are compiled with Cython when it is available, otherwise
+# the pure python module is used as is
+try:
+    from Cython.Build import cythonize
+except ImportError:
+    ext_modules = []
+else:
+    ext_modules = cythonize("twitter_analysis/parse.py", language_level=3)
+
+setuptools.setup(ext_modules=ext_modules)
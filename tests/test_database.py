@@ -0,0 +1,169 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from twitter_analysis import database
+from twitter_analysis.database import TWEET_COLUMNS, USER_COLUMNS, Database
+
+
+def tweet_columns(ids: list) -> dict:
+    """Tweet columns as returned by `parse_tweets`"""
+    columns = {column: [None] * len(ids) for column in TWEET_COLUMNS}
+    columns["id"] = list(ids)
+    columns["tweet_text"] = [f"tweet {i}" for i in ids]
+    columns["urls"] = [""] * len(ids)
+
+    return columns
+
+
+def user_columns(ids: list, followers: list) -> dict:
+    """User columns as returned by `parse_users`"""
+    columns = {column: [None] * len(ids) for column in USER_COLUMNS}
+    columns["id"] = list(ids)
+    columns["username"] = [f"user{i}" for i in ids]
+    columns["followers"] = list(followers)
+
+    return columns
+
+
+class DatabaseTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        self.db = Database(os.path.join(tmp, "test.db"))
+
+    def tearDown(self):
+        self.db.__exit__(None, None, None)
+
+    def query(self, sql: str) -> list:
+        return self.db.read_conn.execute(sql).fetchall()
+
+    def test_insert_tweets_more_than_rows_per_insert(self):
+        ids = list(range(1, 251))
+        self.db.insert_tweets(tweet_columns(ids))
+        self.db.flush()
+
+        self.assertEqual(
+            self.query("SELECT id FROM tweets ORDER BY id"), [(i,) for i in ids]
+        )
+
+    def test_insert_tweets_split_by_max_variables(self):
+        # Three rows per statement, so 10 rows need a short last statement
+        ids = list(range(1, 11))
+        with mock.patch.object(database, "MAX_VARIABLES", len(TWEET_COLUMNS) * 3):
+            self.db.insert_tweets(tweet_columns(ids))
+        self.db.flush()
+
+        self.assertEqual(
+            self.query("SELECT id FROM tweets ORDER BY id"), [(i,) for i in ids]
+        )
+
+    def test_insert_tweets_keeps_existing(self):
+        self.db.insert_tweets(tweet_columns([1, 2]))
+        again = tweet_columns([2, 3])
+        again["tweet_text"] = ["changed", "changed"]
+        self.db.insert_tweets(again)
+        self.db.flush()
+
+        self.assertEqual(
+            self.query("SELECT id, tweet_text FROM tweets ORDER BY id"),
+            [(1, "tweet 1"), (2, "tweet 2"), (3, "changed")],
+        )
+
+    def test_insert_users_duplicate_ids(self):
+        self.db.insert_users(user_columns([1, 2, 1], [10, 20, 30]))
+        self.db.flush()
+        self.assertEqual(
+            self.query("SELECT id, followers FROM users ORDER BY id"),
+            [(1, 30), (2, 20)],
+        )
+
+        # Users seen again are updated with their latest details
+        self.db.insert_users(user_columns([2], [25]))
+        self.db.flush()
+        self.assertEqual(
+            self.query("SELECT id, followers FROM users ORDER BY id"),
+            [(1, 30), (2, 25)],
+        )
+
+    def test_set_tweet_sentiment_overwrites(self):
+        self.db.insert_tweets(tweet_columns([1]))
+        self.db.flush()
+
+        for label, score in (("POSITIVE", 0.9), ("NEGATIVE", 0.8)):
+            self.db.set_tweet_sentiment(
+                [{"id": 1, "sentiment": label, "sentiment_score": score}]
+            )
+
+        self.assertEqual(
+            self.query("SELECT sentiment, sentiment_score FROM tweets"),
+            [("NEGATIVE", 0.8)],
+        )
+
+    def test_get_all_tweets_pages(self):
+        ids = list(range(1, 26))
+        self.db.insert_tweets(tweet_columns(ids))
+        self.db.flush()
+
+        pages = list(self.db.get_all_tweets(batch_size=10))
+
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual([row[0] for page in pages for row in page], ids)
+
+    def test_get_all_tweets_after_id(self):
+        ids = list(range(1, 26))
+        self.db.insert_tweets(tweet_columns(ids))
+        self.db.flush()
+
+        pages = list(self.db.get_all_tweets(batch_size=10, after_id=15))
+
+        self.assertEqual([row[0] for page in pages for row in page], ids[15:])
+
+
+class BulkDatabaseTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        self.path = os.path.join(tmp, "test.db")
+
+    def test_round_trip(self):
+        tweets = tweet_columns([1, 2])
+        tweets["conversation_id"] = [1, 2]
+        tweets["likes"] = [10, 20]
+        tweets["retweets"] = tweets["quotes"] = [0, 0]
+        replies = tweet_columns([11, 12, 13])
+        replies["conversation_id"] = [1, 5, 5]
+
+        with Database(self.path, bulk=True) as db:
+            self.assertIs(db.read_conn, db.write_conn)
+
+            db.drop_indexes()
+            db.insert_tweets(tweets)
+            db.insert_replies(replies)
+            db.flush()
+            db.create_indexes()
+
+            missing = [row for page in db.get_missing_tweets() for row in page]
+            self.assertEqual(missing, [(5,)])
+            self.assertEqual(db.get_top_replied(top_percent=50), [(2, 2)])
+
+        # the exclusive lock is released once closed
+        conn = sqlite3.connect(self.path, timeout=0, isolation_level=None)
+        self.addCleanup(conn.close)
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("ROLLBACK")
+        self.assertEqual(
+            conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND name = ?",
+                ("idx_replies_conversation_id",),
+            ).fetchall(),
+            [("idx_replies_conversation_id",)],
+        )
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM replies").fetchone(), (3,))
+
+
+if __name__ == "__main__":
+    unittest.main()
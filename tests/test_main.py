@@ -0,0 +1,90 @@
+import threading
+import time
+import unittest
+
+from twitter_analysis.main import fetch_replies, prefetch
+
+
+class PrefetchTest(unittest.TestCase):
+    def test_yields_in_order(self):
+        self.assertEqual(list(prefetch(range(10), maxsize=2)), list(range(10)))
+
+    def test_reraises_producer_error(self):
+        def pages():
+            yield 1
+            yield 2
+            raise ValueError("api error")
+
+        results = prefetch(pages())
+
+        self.assertEqual(next(results), 1)
+        self.assertEqual(next(results), 2)
+        with self.assertRaisesRegex(ValueError, "api error"):
+            next(results)
+
+
+class FetchRepliesTest(unittest.TestCase):
+    def test_keeps_order(self):
+        first_waiting = threading.Event()
+        later_done = threading.Event()
+
+        class Twitter:
+            """Stands in for TwitterApiV2"""
+
+            def search_replies(self, conversation_id):
+                if conversation_id == 1:
+                    # finish after the conversations submitted after it
+                    first_waiting.set()
+                    later_done.wait(timeout=5)
+                else:
+                    first_waiting.wait(timeout=5)
+                    later_done.set()
+                yield [conversation_id], [], {}
+
+        results = list(fetch_replies(Twitter(), [(10, 1), (20, 2), (30, 3)], 2))
+
+        self.assertTrue(later_done.is_set())
+        self.assertEqual(
+            results,
+            [
+                (10, 1, [([1], [], {})]),
+                (20, 2, [([2], [], {})]),
+                (30, 3, [([3], [], {})]),
+            ],
+        )
+
+    def test_close_does_not_wait(self):
+        release = threading.Event()
+        pages = {}
+
+        class Twitter:
+            """Stands in for TwitterApiV2"""
+
+            def search_replies(self, conversation_id):
+                pages[conversation_id] = 1
+                yield [conversation_id], [], {}
+                # the other conversations have more pages, which only
+                # come once released
+                for _ in range(3):
+                    if conversation_id == 1:
+                        return
+                    release.wait(timeout=2)
+                    pages[conversation_id] += 1
+                    yield [conversation_id], [], {}
+
+        conversations = [(i, i) for i in range(1, 10)]
+        results = fetch_replies(Twitter(), conversations, workers=2)
+        self.assertEqual(next(results)[1], 1)
+
+        start = time.monotonic()
+        results.close()
+        self.assertLess(time.monotonic() - start, 1)
+
+        # running fetches stop after their current page
+        release.set()
+        time.sleep(0.2)
+        self.assertEqual(pages, {1: 1, 2: 2, 3: 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
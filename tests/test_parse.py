@@ -0,0 +1,172 @@
+import unittest
+
+from twitter_analysis.parse import (
+    parse_entities,
+    parse_timestamp,
+    parse_tweet,
+    parse_tweets,
+    parse_user,
+    parse_users,
+)
+
+
+def make_tweet(tweet_id: str = "10", **fields) -> dict:
+    """Tweet object as returned by the twitter api"""
+    tweet = {
+        "id": tweet_id,
+        "author_id": "5",
+        "conversation_id": tweet_id,
+        "text": "hello",
+        "created_at": "2022-07-01T12:34:56.000Z",
+        "public_metrics": {
+            "like_count": 1,
+            "reply_count": 2,
+            "retweet_count": 3,
+            "quote_count": 4,
+        },
+    }
+    tweet.update(fields)
+
+    return tweet
+
+
+def make_user(user_id: str = "5") -> dict:
+    """User object as returned by the twitter api"""
+    return {
+        "id": user_id,
+        "username": "someone",
+        "name": "Some One",
+        "verified": False,
+        "created_at": "2010-01-01T00:00:00.000Z",
+        "description": "bio",
+        "public_metrics": {"following_count": 7, "followers_count": 8},
+    }
+
+
+class ParseTest(unittest.TestCase):
+    def test_parse_timestamp(self):
+        self.assertEqual(parse_timestamp("2022-07-01T12:34:56.000Z"), 1656678896)
+
+    def test_parse_entities(self):
+        tweet = make_tweet(
+            entities={
+                "hashtags": [{"tag": "one"}, {"tag": "two"}],
+                "mentions": [{"username": "someone"}],
+                "urls": [
+                    {"expanded_url": "https://example.com/photo/1"},
+                    {"expanded_url": "https://twitter.com/a/status/1/photo/1"},
+                    {"expanded_url": "https://twitter.com/a/status/1/photo/1"},
+                    {"expanded_url": "https://twitter.com/a/status/1/video/1"},
+                ],
+            }
+        )
+
+        hashtags, mentions, urls, images, videos = parse_entities(tweet)
+
+        self.assertEqual(hashtags, ["one", "two"])
+        self.assertEqual(mentions, ["someone"])
+        self.assertEqual(len(urls), 4)
+        # only links to twitter count as attached media
+        self.assertEqual(images, 2)
+        self.assertEqual(videos, 1)
+
+    def test_parse_entities_missing(self):
+        self.assertEqual(parse_entities(make_tweet()), ([], [], [], 0, 0))
+        self.assertEqual(
+            parse_entities(make_tweet(entities={"urls": []})), ([], [], [], 0, 0)
+        )
+
+    def test_parse_tweet(self):
+        tweet = make_tweet(
+            entities={
+                "hashtags": [{"tag": "one"}, {"tag": "two"}],
+                "urls": [{"expanded_url": "https://example.com"}],
+            }
+        )
+
+        self.assertEqual(
+            parse_tweet(tweet, {}),
+            {
+                "id": "10",
+                "parent_id": None,
+                "conversation_id": "10",
+                "author": "5",
+                "url": "https://twitter.com/5/status/10",
+                "tweet_text": "hello",
+                "timestamp": 1656678896,
+                "hashtags": "one,two",
+                "mentions": None,
+                "videos": 0,
+                "images": 0,
+                "urls": "https://example.com",
+                "location": None,
+                "likes": 1,
+                "replies": 2,
+                "retweets": 3,
+                "quotes": 4,
+                "sentiment": None,
+                "sentiment_score": None,
+            },
+        )
+
+    def test_parent_is_first_replied_to(self):
+        tweet = make_tweet(
+            referenced_tweets=[
+                {"type": "quoted", "id": "1"},
+                {"type": "replied_to", "id": "2"},
+                {"type": "replied_to", "id": "3"},
+            ]
+        )
+
+        self.assertEqual(parse_tweet(tweet, {})["parent_id"], "2")
+        self.assertIsNone(
+            parse_tweet(make_tweet(referenced_tweets=[]), {})["parent_id"]
+        )
+
+    def test_location(self):
+        tweets = [
+            make_tweet("1", geo={"place_id": "p1"}),
+            make_tweet("2"),
+            make_tweet("3", geo={"place_id": "unknown"}),
+        ]
+
+        self.assertEqual(
+            parse_tweets(tweets, {"p1": "Dublin, Ireland"})["location"],
+            ["Dublin, Ireland", None, None],
+        )
+        self.assertEqual(parse_tweets(tweets, {})["location"], [None, None, None])
+
+    def test_parse_tweets_columns(self):
+        tweets = parse_tweets([make_tweet("1"), make_tweet("2")], {})
+
+        self.assertEqual(tweets["id"], ["1", "2"])
+        self.assertTrue(all(len(column) == 2 for column in tweets.values()))
+
+    def test_empty_page(self):
+        tweets = parse_tweets([], {})
+        users = parse_users([])
+
+        self.assertTrue(tweets)
+        self.assertTrue(all(column == [] for column in tweets.values()))
+        self.assertTrue(users)
+        self.assertTrue(all(column == [] for column in users.values()))
+
+    def test_parse_user(self):
+        self.assertEqual(
+            parse_user(make_user()),
+            {
+                "id": "5",
+                "username": "someone",
+                "name": "Some One",
+                "verified": False,
+                "location": None,
+                "following": 7,
+                "followers": 8,
+                "date_joined": "2010-01-01T00:00:00.000Z",
+                "bio": "bio",
+            },
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
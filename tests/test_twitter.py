@@ -0,0 +1,135 @@
+import threading
+import unittest
+from unittest import mock
+
+from twarc.client2 import Twarc2
+
+from twitter_analysis import twitter
+from twitter_analysis.twitter import REQUEST_INTERVAL, TwitterApiV2
+
+
+class GetTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = 100.0
+        self.sleeps = []
+
+        def sleep(seconds):
+            self.sleeps.append(seconds)
+            self.clock += seconds
+
+        patch_time = mock.patch.object(twitter, "time")
+        fake_time = patch_time.start()
+        self.addCleanup(patch_time.stop)
+        fake_time.monotonic.side_effect = lambda: self.clock
+        fake_time.sleep.side_effect = sleep
+
+        patch_get = mock.patch.object(
+            Twarc2, "get", return_value=mock.Mock(content=b'{"data": []}')
+        )
+        self.twarc_get = patch_get.start()
+        self.addCleanup(patch_get.stop)
+
+        self.api = TwitterApiV2("token")
+
+    def test_requests_from_threads_are_spaced(self):
+        barrier = threading.Barrier(2)
+
+        def get():
+            barrier.wait(timeout=5)
+            self.api.get("https://api.twitter.com/2/tweets/search/all")
+
+        threads = [threading.Thread(target=get) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        self.assertEqual(self.twarc_get.call_count, 2)
+        self.assertEqual(len(self.sleeps), 1)
+        self.assertAlmostEqual(self.sleeps[0], REQUEST_INTERVAL)
+
+    def test_no_wait_after_interval(self):
+        self.api.get("https://api.twitter.com/2/tweets")
+        self.clock += REQUEST_INTERVAL
+
+        response = self.api.get("https://api.twitter.com/2/tweets")
+
+        self.assertEqual(self.sleeps, [])
+        self.assertEqual(response.json(), {"data": []})
+
+
+class SearchTest(unittest.TestCase):
+    def setUp(self):
+        self.requests = []
+        self.page_size = 37
+
+        def search_all(**kwargs):
+            self.requests.append(kwargs)
+            for page in range(100):
+                start = page * self.page_size
+                tweets = [{"id": str(i)} for i in range(start, start + self.page_size)]
+                self.requests.append(page)
+                yield {"data": tweets, "includes": {"users": []}}
+
+        patch = mock.patch.object(Twarc2, "search_all", side_effect=search_all)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+        self.api = TwitterApiV2("token")
+
+    def search(self, *args, **kwargs) -> tuple:
+        """Tweet ids returned by `search`, and the number of pages requested"""
+        self.requests.clear()
+        pages = list(self.api.search(*args, **kwargs))
+        tweets = [tweet["id"] for page_tweets, _, _ in pages for tweet in page_tweets]
+
+        return tweets, len(self.requests) - 1
+
+    def test_limit_with_partial_pages(self):
+        tweets, requests = self.search("query", limit=100)
+
+        # the last page is cut short at the limit
+        self.assertEqual(tweets, [str(i) for i in range(100)])
+        self.assertEqual(requests, 3)
+        self.assertEqual(self.requests[0]["max_results"], 100)
+
+    def test_limit_over_max_results(self):
+        tweets, requests = self.search("query", limit=1200)
+
+        self.assertEqual(len(tweets), 1200)
+        self.assertEqual(requests, 33)
+        self.assertEqual(self.requests[0]["max_results"], 500)
+
+    def test_limit_on_page_boundary(self):
+        tweets, requests = self.search("query", limit=74)
+
+        self.assertEqual(len(tweets), 74)
+        self.assertEqual(requests, 2)
+
+    def test_max_pages(self):
+        tweets, requests = self.search("query", max_pages=2)
+        self.assertEqual(len(tweets), 74)
+        self.assertEqual(requests, 2)
+
+        tweets, requests = self.search("query", limit=100, max_pages=2)
+        self.assertEqual(len(tweets), 74)
+        self.assertEqual(requests, 2)
+
+    def test_no_limit(self):
+        tweets, requests = self.search("query")
+
+        self.assertEqual(len(tweets), 3700)
+        self.assertEqual(requests, 100)
+
+    def test_search_replies(self):
+        list(self.api.search_replies(1234))
+
+        kwargs = self.requests[0]
+        self.assertEqual(kwargs["query"], "conversation_id:1234 is:reply")
+        self.assertEqual(kwargs["since_id"], 1234)
+        self.assertIsNone(kwargs["start_time"])
+        self.assertIsNone(kwargs["end_time"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,7 @@
 import sqlite3
-from typing import Iterable, Tuple
+from functools import lru_cache
+from itertools import chain
+from typing import Dict, Iterable, Tuple
 
 TWEETS_DDL = """
 CREATE TABLE IF NOT EXISTS tweets (
@@ -63,80 +65,77 @@ CREATE TABLE IF NOT EXISTS users (
 )
 """
 
-INSERT_TWEET_DML = """
-INSERT INTO tweets (id,parent_id,conversation_id, author,url,tweet_text,timestamp,hashtags,mentions,urls,images,videos,location,likes,replies,retweets,quotes,sentiment,sentiment_score)
-VALUES (
-    :id,
-    :parent_id,
-    :conversation_id,
-    :author,
-    :url,
-    :tweet_text,
-    :timestamp,
-    :hashtags,
-    :mentions,
-    :urls,
-    :images,
-    :videos,
-    :location,
-    :likes,
-    :replies,
-    :retweets,
-    :quotes,
-    :sentiment,
-    :sentiment_score
+REPLIES_CONVERSATION_INDEX_DDL = """
+CREATE INDEX IF NOT EXISTS idx_replies_conversation_id
+ON replies (conversation_id)
+"""
+
+# Indexes other than the primary keys, these can be dropped during a bulk
+# ingest and rebuilt afterwards
+SECONDARY_INDEXES = {
+    "idx_replies_conversation_id": REPLIES_CONVERSATION_INDEX_DDL,
+}
+
+TWEET_COLUMNS = (
+    "id",
+    "parent_id",
+    "conversation_id",
+    "author",
+    "url",
+    "tweet_text",
+    "timestamp",
+    "hashtags",
+    "mentions",
+    "urls",
+    "images",
+    "videos",
+    "location",
+    "likes",
+    "replies",
+    "retweets",
+    "quotes",
+    "sentiment",
+    "sentiment_score",
+)
+
+USER_COLUMNS = (
+    "id",
+    "username",
+    "name",
+    "verified",
+    "location",
+    "following",
+    "followers",
+    "date_joined",
+    "bio",
 )
+
+# The insert statements are templates, `values` is filled in with one
+# placeholder group per row by `values_statement`
+INSERT_TWEET_DML = """
+INSERT INTO tweets ({columns})
+VALUES {values}
 ON CONFLICT (id) DO NOTHING
 """
 
 INSERT_REPLIES_DML = """
-INSERT INTO replies (id,parent_id,conversation_id, author,url,tweet_text,timestamp,hashtags,mentions,urls,images,videos,location,likes,replies,retweets,quotes,sentiment,sentiment_score)
-VALUES (
-    :id,
-    :parent_id,
-    :conversation_id,
-    :author,
-    :url,
-    :tweet_text,
-    :timestamp,
-    :hashtags,
-    :mentions,
-    :urls,
-    :images,
-    :videos,
-    :location,
-    :likes,
-    :replies,
-    :retweets,
-    :quotes,
-    :sentiment,
-    :sentiment_score
-)
+INSERT INTO replies ({columns})
+VALUES {values}
 ON CONFLICT (id) DO NOTHING
 """
 
 INSERT_USER_DML = """
-INSERT INTO users (id, username, name, verified, location, following, followers, date_joined, bio)
-VALUES (
-    :id,
-    :username,
-    :name,
-    :verified,
-    :location,
-    :following,
-    :followers,
-    :date_joined,
-    :bio
-)
+INSERT INTO users ({columns})
+VALUES {values}
 ON CONFLICT (id) DO UPDATE SET
-    username = :username,
-    name = :name,
-    verified = :verified,
-    location = :location,
-    following = :following,
-    followers = :followers,
-    date_joined = :date_joined,
-    bio = :bio
+    username = excluded.username,
+    name = excluded.name,
+    verified = excluded.verified,
+    location = excluded.location,
+    following = excluded.following,
+    followers = excluded.followers,
+    date_joined = excluded.date_joined,
+    bio = excluded.bio
 """
 
 UPDATE_TWEET_SENTIMENT_DML = """
@@ -155,10 +154,16 @@ WHERE id = :id
 
 ALL_TWEETS_DML = """
 SELECT id, tweet_text, urls FROM tweets t
+WHERE id > :last_id
+ORDER BY id
+LIMIT :batch_size
 """
 
 ALL_REPLIES_DML = """
 SELECT id, tweet_text, urls FROM replies t
+WHERE id > :last_id
+ORDER BY id
+LIMIT :batch_size
 """
 
 ALL_USERS_DML = """
@@ -179,82 +184,233 @@ SELECT DISTINCT id, conversation_id FROM (
 -- WHERE x.id NOT IN (SELECT parent_id FROM replies);
 """
 MISSING_CONVERSATION_TWEETS_DML = """
-SELECT DISTINCT conversation_id 
-FROM replies
-WHERE conversation_id NOT IN (SELECT id FROM tweets);
+SELECT DISTINCT r.conversation_id
+FROM replies r
+LEFT JOIN tweets t ON t.id = r.conversation_id
+WHERE t.id IS NULL;
 """
 
+# Applied to every connection. WAL + synchronous=NORMAL avoids the journal
+# fsync on each commit which dominates insert time on large ingests
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-1048576",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA busy_timeout=5000",
+)
+
+# Number of prepared statements kept per connection. Each batch size of the
+# multi-row inserts is a distinct statement
+STATEMENT_CACHE = 256
+
+# Number of rows bound to a single multi-row INSERT statement
+ROWS_PER_INSERT = 100
+
+# Older SQLite builds limit a statement to 999 bound parameters
+MAX_VARIABLES = 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999
+
+
+@lru_cache(maxsize=64)
+def values_statement(dml: str, columns: Tuple[str, ...], rows: int) -> str:
+    """Expand an insert template into a statement binding `rows` rows"""
+    placeholders = "(" + ",".join("?" * len(columns)) + ")"
+
+    return dml.format(columns=",".join(columns), values=",".join([placeholders] * rows))
+
 
 class Database:
     """Database Manager"""
 
-    conn: sqlite3.Connection
-
-    def __init__(self, database: str) -> None:
-        self.conn = sqlite3.connect(database)
+    write_conn: sqlite3.Connection
+    write_cursor: sqlite3.Cursor
+    read_conn: sqlite3.Connection
+
+    def __init__(self, database: str, bulk: bool = False) -> None:
+        """
+        Args:
+            database: Path to the sqlite3 database file
+            bulk: Hold an exclusive lock on the database until it is closed.
+                Saves taking the file lock on every transaction but no other
+                process can use the database in the meantime
+        """
+        self.write_conn = self.connect(database, isolation_level=None)
+        if bulk:
+            self.write_conn.execute("PRAGMA locking_mode=EXCLUSIVE")
+        self.write_cursor = self.write_conn.cursor()
         self.setup()
 
+        if bulk:
+            # The exclusive lock would keep a second connection out as well
+            self.read_conn = self.write_conn
+        else:
+            # Separate connections so reads don't wait on, or block, the writer
+            self.read_conn = self.connect(database, check_same_thread=False)
+            self.read_conn.execute("PRAGMA query_only=1")
+
+    @staticmethod
+    def connect(database: str, **kwargs) -> sqlite3.Connection:
+        """Open a connection to `database` with CONNECTION_PRAGMAS applied"""
+        conn = sqlite3.connect(database, cached_statements=STATEMENT_CACHE, **kwargs)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+
+        return conn
+
     def __enter__(self):
         return self
 
     def __exit__(self, exit_type, value, traceback) -> None:
-        del exit_type, value, traceback
-        self.conn.close()
+        del value, traceback
+        if exit_type is None:
+            self.flush()
+        self.write_cursor.close()
+        self.read_conn.close()
+        self.write_conn.close()
+
+    def begin(self):
+        """Start a write transaction unless one is already open
+
+        BEGIN IMMEDIATE takes the write lock upfront so a transaction can't
+        fail with SQLITE_BUSY half way through when upgrading to a writer.
+        """
+        if not self.write_conn.in_transaction:
+            self.write_conn.execute("BEGIN IMMEDIATE")
+
+    def flush(self):
+        """Commit any pending inserts
+
+        The insert_* methods open a transaction but don't commit it, so
+        callers can batch many pages of results into a single transaction.
+        """
+        self.write_conn.commit()
 
     def setup(self):
         """Populate the database with necessary table"""
-        cursor = self.conn.cursor()
+        cursor = self.write_cursor
 
         cursor.execute(TWEETS_DDL)
         cursor.execute(REPLIES_DDL)
         cursor.execute(USERS_DDL)
-
-    def insert_users(self, users: list):
-        cursor = self.conn.cursor()
-        cursor.executemany(INSERT_USER_DML, users)
-        self.conn.commit()
-
-    def insert_tweets(self, tweets: list):
-        cursor = self.conn.cursor()
-        cursor.executemany(INSERT_TWEET_DML, tweets)
-        self.conn.commit()
-
-    def insert_replies(self, tweet_replies: list):
-        cursor = self.conn.cursor()
-        cursor.executemany(INSERT_REPLIES_DML, tweet_replies)
-        self.conn.commit()
+        for index_ddl in SECONDARY_INDEXES.values():
+            cursor.execute(index_ddl)
+
+        # Refresh planner statistics for tables that changed significantly
+        cursor.execute("PRAGMA optimize")
+
+    def drop_indexes(self):
+        """Drop the secondary indexes so inserts only update the tables
+
+        Call `create_indexes` once the inserts are done.
+        """
+        self.flush()
+        for index in SECONDARY_INDEXES:
+            self.write_cursor.execute(f"DROP INDEX IF EXISTS {index}")
+
+    def create_indexes(self):
+        """Rebuild the secondary indexes and refresh planner statistics"""
+        self.flush()
+        for index_ddl in SECONDARY_INDEXES.values():
+            self.write_cursor.execute(index_ddl)
+        self.write_cursor.execute("ANALYZE")
+
+    def insert_many(self, dml: str, columns: Tuple[str, ...], rows: list):
+        """Insert `rows` binding many rows to each statement
+
+        Args:
+            dml: Insert template, see `values_statement`
+            columns: Columns to insert, in order
+            rows: List of tuples ordered as `columns`
+        """
+        self.begin()
+        cursor = self.write_cursor
+        batch_size = min(ROWS_PER_INSERT, MAX_VARIABLES // len(columns))
+
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i : i + batch_size]
+            cursor.execute(
+                values_statement(dml, columns, len(batch)),
+                list(chain.from_iterable(batch)),
+            )
+
+    def insert_users(self, users: Dict[str, list]):
+        """Insert users given as columns, see `parse_users`"""
+        rows = list(zip(*(users[column] for column in USER_COLUMNS)))
+        self.insert_many(INSERT_USER_DML, USER_COLUMNS, rows)
+
+    def insert_tweets(self, tweets: Dict[str, list]):
+        """Insert tweets given as columns, see `parse_tweets`"""
+        rows = list(zip(*(tweets[column] for column in TWEET_COLUMNS)))
+        self.insert_many(INSERT_TWEET_DML, TWEET_COLUMNS, rows)
+
+    def insert_replies(self, tweet_replies: Dict[str, list]):
+        """Insert replies given as columns, see `parse_tweets`"""
+        rows = list(zip(*(tweet_replies[column] for column in TWEET_COLUMNS)))
+        self.insert_many(INSERT_REPLIES_DML, TWEET_COLUMNS, rows)
 
     def get_top_replied(self, top_percent: int = 5):
         """Returns the most popular tweets"""
-        cursor = self.conn.cursor()
+        cursor = self.read_conn.cursor()
         cursor.execute(TOP_REPLIED_DML, {"top_percent": top_percent})
 
         return cursor.fetchall()
 
     def get_paged_query(self, query: str, batch_size: int = 500):
         """Returns the result of a query in pages determined by `batch_size`"""
-        cursor = self.conn.cursor()
+        cursor = self.read_conn.cursor()
 
         cursor.execute(query)
 
         while page := cursor.fetchmany(batch_size):
             yield page
 
+    def get_keyset_query(self, query: str, batch_size: int = 500, after_id: int = 0):
+        """Returns the result of a query in pages determined by `batch_size`
+
+        Each page is fetched with its own primary key range scan starting
+        after the last id of the previous page, so iteration can be resumed
+        from any id with `after_id`.
+
+        `query` must select `id` first, filter on `id > :last_id`, order by
+        `id` and be limited to `:batch_size` rows.
+        """
+        cursor = self.read_conn.cursor()
+        params = {"last_id": after_id, "batch_size": batch_size}
+
+        while page := cursor.execute(query, params).fetchall():
+            yield page
+            params["last_id"] = page[-1][0]
+
     def set_tweet_sentiment(self, batch):
-        cur = self.conn.cursor()
+        """Overwrite the sentiment of stored tweets, e.g. to re-score them
+
+        New tweets already get their sentiment on insert
+        """
+        self.begin()
+        cur = self.write_cursor
         cur.executemany(UPDATE_TWEET_SENTIMENT_DML, batch)
-        self.conn.commit()
+        self.write_conn.commit()
 
     def set_replies_sentiment(self, batch: list):
-        cur = self.conn.cursor()
+        """Overwrite the sentiment of stored replies, e.g. to re-score them
+
+        New replies already get their sentiment on insert
+        """
+        self.begin()
+        cur = self.write_cursor
         cur.executemany(UPDATE_REPLIES_SENTIMENT_DML, batch)
-        self.conn.commit()
+        self.write_conn.commit()
 
-    def get_all_tweets(self, batch_size: int = 500) -> Iterable:
-        return self.get_paged_query(ALL_TWEETS_DML, batch_size=batch_size)
+    def get_all_tweets(self, batch_size: int = 500, after_id: int = 0) -> Iterable:
+        return self.get_keyset_query(
+            ALL_TWEETS_DML, batch_size=batch_size, after_id=after_id
+        )
 
-    def get_all_replies(self, batch_size: int = 500) -> Iterable:
-        return self.get_paged_query(ALL_REPLIES_DML, batch_size=batch_size)
+    def get_all_replies(self, batch_size: int = 500, after_id: int = 0) -> Iterable:
+        return self.get_keyset_query(
+            ALL_REPLIES_DML, batch_size=batch_size, after_id=after_id
+        )
 
     def get_missing_tweets(self, batch_size: int = 500) -> Iterable:
         return self.get_paged_query(
@@ -1,13 +1,42 @@
 import argparse
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from functools import partial
-from typing import Tuple
+from typing import Iterable, Iterator, Tuple
 
 import yaml
 
 from twitter_analysis.database import Database
+from twitter_analysis.parse import parse_tweets, parse_users
 from twitter_analysis.sentiment import Sentiment
-from twitter_analysis.twitter import TwitterApiV2, parse_tweet, parse_user
+from twitter_analysis.twitter import TwitterApiV2
+
+# Number of api pages to insert before committing to the database
+COMMIT_INTERVAL = 20
+
+# Number of api pages fetched ahead of the page being processed
+PREFETCH_PAGES = 4
+
+# Number of conversations whose replies are fetched at the same time
+REPLY_WORKERS = 4
+
+
+class LabelCache(dict):
+    """Maps sentiment model labels to their upper case form
+
+    Models only return a handful of distinct labels so each one is only
+    converted once.
+    """
+
+    def __missing__(self, label: str) -> str:
+        upper = self[label] = label.upper()
+        return upper
+
+
+_LABEL_CACHE = LabelCache()
 
 
 def parse_date(d: str):
@@ -65,10 +94,129 @@ def parse_args() -> Tuple:
         default="config.yaml",
         help="Path to config file (Default: config.yaml)",
     )
+    parser.add_argument(
+        "-b",
+        "--bulk",
+        dest="bulk",
+        action="store_true",
+        help="Bulk load, e.g. the first download of a search. Faster, but\n"
+        "the database can't be read by anything else until it finishes",
+    )
 
     args = parser.parse_args()
 
-    return (args.query, args.lang, args.config, args.start, args.end, args.limit)
+    return (
+        args.query,
+        args.lang,
+        args.config,
+        args.start,
+        args.end,
+        args.limit,
+        args.bulk,
+    )
+
+
+def prefetch(iterable: Iterable, maxsize: int = PREFETCH_PAGES) -> Iterator:
+    """Iterate over `iterable` from a background thread
+
+    Lets the next api pages download while the current one goes through
+    sentiment analysis and gets inserted into the database.
+
+    Args:
+        iterable: Iterable to consume in the background, e.g. api pages
+        maxsize: Maximum number of items buffered ahead of the consumer
+
+    Yields:
+        The items of `iterable` in order
+    """
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    done = object()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def producer():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+        except Exception as err:  # pylint: disable=broad-except
+            put((done, err))
+        else:
+            put((done, None))
+
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, err = items.get()
+            if item is done:
+                if err is not None:
+                    raise err
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def fetch_replies(
+    twitter: TwitterApiV2, conversations: Iterable, workers: int = REPLY_WORKERS
+) -> Iterator:
+    """Fetch the replies of several conversations concurrently
+
+    Conversations are independent of each other so up to `workers` of them
+    are downloaded at once, ahead of the one being processed.
+
+    Args:
+        twitter: Twitter api client
+        conversations: (parent_id, conversation_id) pairs
+        workers: Number of conversations fetched at the same time
+
+    Yields:
+        parent_id, conversation_id and the list of (tweets, users, places)
+        pages for each conversation, in the order given
+    """
+
+    stop = threading.Event()
+
+    def fetch(conversation_id) -> list:
+        pages = []
+        for tweets, users, places in twitter.search_replies(conversation_id):
+            if not tweets or stop.is_set():
+                break
+            pages.append((tweets, users, places))
+
+        return pages
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    pending = deque()
+    try:
+        for parent_id, conversation_id in conversations:
+            future = executor.submit(fetch, conversation_id)
+            pending.append((parent_id, conversation_id, future))
+
+            if len(pending) > workers:
+                parent_id, conversation_id, future = pending.popleft()
+                yield parent_id, conversation_id, future.result()
+
+        while pending:
+            parent_id, conversation_id, future = pending.popleft()
+            yield parent_id, conversation_id, future.result()
+    finally:
+        # When the consumer stops early, e.g. on an error or Ctrl-C, drop the
+        # queued conversations and stop the running ones after their current
+        # page rather than waiting for all of them to download
+        stop.set()
+        for _, _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
 
 
 def process_batch_tweets(
@@ -86,29 +234,25 @@ def process_batch_tweets(
         places: list of places
 
     Returns:
-        A Tuple of containing a list of parsed tweets and users
+        A Tuple of containing the parsed tweet and user columns
     """
 
-    parsed_tweets = [parse_tweet(tweet, places) for tweet in tweets]
+    parsed_tweets = parse_tweets(tweets, places)
 
-    sentiments = sentiment_pipeline.pipe(
-        [tweet["tweet_text"] for tweet in parsed_tweets]
-    )
-    return (
-        [
-            {
-                **tweet,
-                "sentiment": sentiment["label"].upper(),
-                "sentiment_score": sentiment["score"],
-            }
-            for tweet, sentiment in zip(parsed_tweets, sentiments)
-        ],
-        [parse_user(user) for user in users],
-    )
+    sentiments = sentiment_pipeline.pipe(parsed_tweets["tweet_text"])
+
+    # fill in the sentiment columns parse_tweets left empty
+    labels = parsed_tweets["sentiment"]
+    scores = parsed_tweets["sentiment_score"]
+    for i, sentiment in enumerate(sentiments):
+        labels[i] = _LABEL_CACHE[sentiment["label"]]
+        scores[i] = sentiment["score"]
+
+    return parsed_tweets, parse_users(users)
 
 
 def main():
-    query, lang, config_file, start, end, limit = parse_args()
+    query, lang, config_file, start, end, limit, bulk = parse_args()
 
     with open(config_file, encoding="utf8") as stream:
         config = yaml.safe_load(stream)
@@ -124,51 +268,76 @@ def main():
 
         # we store the data locally in a sqlie3 database.
         # This makes it easier to process the data after download
-        with Database(f"data_{lang}.db") as db:
+        with Database(f"data_{lang}.db", bulk=bulk) as db:
+
+            # On a bulk load, indexes are rebuilt once the tweets and replies
+            # are in, which is cheaper than updating them on every insert. A
+            # short run into a large database would pay for a full rebuild
+            if bulk:
+                db.drop_indexes()
 
             # First we get all the top level tweets
 
             full_query = f"({query}) -is:retweet lang:{lang}"
             print(f"Fetching tweets for search: {full_query}")
-            results = twitter.search(full_query, start=start, end=end, limit=limit)
-            for tweets, users, places in results:
-                print(".", end="", flush=True)
+            results = prefetch(
+                twitter.search(full_query, start=start, end=end, limit=limit)
+            )
+            page = 0
+            for page, (tweets, users, places) in enumerate(results, 1):
                 processed_tweets, processed_users = batch_processor(
                     tweets, users, places
                 )
                 db.insert_tweets(processed_tweets)
                 db.insert_users(processed_users)
+                if page % COMMIT_INTERVAL == 0:
+                    db.flush()
+                    print(f"Saved {page} pages of tweets")
 
-            print(flush=True)
+            db.flush()
+            print(f"Saved {page} pages of tweets")
 
             # get replies to top 5% of replied tweets
             print("fetching top replied tweets.")
-            for parent_id, conversation_id in db.get_top_replied(top_percent=5):
+            top_replied = db.get_top_replied(top_percent=5)
+            # Most conversations only have a page of replies, so pages are
+            # counted across all of them rather than committing each one
+            page = 0
+            for parent_id, conversation_id, replies in fetch_replies(
+                twitter, top_replied
+            ):
                 print(
-                    f"Fetching replies for conversation: {conversation_id} Parent tweet: {parent_id}",
-                    flush=True,
+                    f"Fetched {len(replies)} pages of replies for conversation: "
+                    f"{conversation_id} Parent tweet: {parent_id}"
                 )
 
-                replies = twitter.search_replies(conversation_id)
-
                 for tweets, users, places in replies:
-                    if not tweets:
-                        break
-
-                    print(".", end="", flush=True)
                     processed_replies, processed_users = batch_processor(
                         tweets, users, places
                     )
                     db.insert_replies(processed_replies)
                     db.insert_users(processed_users)
-                print(flush=True)
+                    page += 1
+                    if page % COMMIT_INTERVAL == 0:
+                        db.flush()
 
-            # We need to go through the replies again to get the top level tweets
-            for batch in db.get_missing_tweets(batch_size=100):
-                tweets = twitter.tweet_lookup(tweet_ids=[id[0] for id in batch])
-                for tweets, users, places in tweets:
-                    processed_replies, processed_users = batch_processor(
-                        tweets, users, places
-                    )
-                    db.insert_tweets(processed_replies)
-                    db.insert_users(processed_users)
+            db.flush()
+
+            if bulk:
+                db.create_indexes()
+
+            # We need to go through the replies again to get the top level tweets.
+            # twarc looks them up 100 ids at a time, so a single lookup lets the
+            # next page download while the current one is processed
+            missing = [id[0] for batch in db.get_missing_tweets() for id in batch]
+            lookup = prefetch(twitter.tweet_lookup(tweet_ids=missing))
+            for page, (tweets, users, places) in enumerate(lookup, 1):
+                processed_replies, processed_users = batch_processor(
+                    tweets, users, places
+                )
+                db.insert_tweets(processed_replies)
+                db.insert_users(processed_users)
+                if page % COMMIT_INTERVAL == 0:
+                    db.flush()
+
+            db.flush()
@@ -0,0 +1,217 @@
+# Parsers for api objects. This module is kept free of dependencies so it can
+# be compiled with Cython (see setup.py), when it isn't the pure python
+# version is used.
+from datetime import datetime
+from typing import Dict, Tuple
+
+# Tweet links start with this. Links to photos and videos attached to a
+# tweet also end with /photo/1 or /video/1
+TWITTER_URL = "https://twitter.com/"
+
+
+def parse_timestamp(created_at: str) -> int:
+    """convert an api timestamp, e.g. 2022-07-01T12:34:56.000Z, to epoch seconds"""
+    return int(datetime.fromisoformat(created_at.replace("Z", "+00:00")).timestamp())
+
+
+def parse_entities(tweet: dict) -> Tuple[list, list, list, int, int]:
+    """get the hashtags, mentions and urls of a tweet
+
+    Photos and videos are counted while going through the urls
+
+    Args:
+        tweet (dict): tweet object from the twitter api
+
+    Returns:
+        tuple: hashtags, mentions, expanded urls, number of images and
+            number of videos
+    """
+    if "entities" not in tweet:
+        return [], [], [], 0, 0
+
+    entities = tweet["entities"]
+
+    urls = []
+    images = videos = 0
+    for url in entities.get("urls", ()):
+        expanded_url = url["expanded_url"]
+        urls.append(expanded_url)
+
+        if not expanded_url.startswith(TWITTER_URL):
+            continue
+        if expanded_url.endswith("/photo/1"):
+            images += 1
+        elif expanded_url.endswith("/video/1"):
+            videos += 1
+
+    return (
+        [hashtag["tag"] for hashtag in entities.get("hashtags", ())],
+        [mention["username"] for mention in entities.get("mentions", ())],
+        urls,
+        images,
+        videos,
+    )
+
+
+def parse_tweets(tweets: list, places: dict) -> Dict[str, list]:
+    """parse a page of tweet objects into database format
+
+    Each field is appended to a list per column rather than building a dict
+    per tweet.
+
+    Args:
+        tweets (list): tweet objects from the twitter api
+        places (dict): list of places from the twitter api
+
+    Returns:
+        dict: Custom tweet columns, one list per field
+    """
+    ids = []
+    parent_ids = []
+    conversation_ids = []
+    authors = []
+    tweet_urls = []
+    texts = []
+    timestamps = []
+    hashtag_col = []
+    mention_col = []
+    video_col = []
+    image_col = []
+    url_col = []
+    likes = []
+    replies = []
+    retweets = []
+    quotes = []
+
+    for tweet in tweets:
+        hashtags, mentions, urls, images, videos = parse_entities(tweet)
+
+        referenced_tweet = None
+        for referenced in tweet.get("referenced_tweets") or ():
+            if referenced["type"] == "replied_to":
+                referenced_tweet = referenced["id"]
+                break
+
+        tweet_id = tweet["id"]
+        author_id = tweet["author_id"]
+
+        ids.append(tweet_id)
+        parent_ids.append(referenced_tweet)
+        conversation_ids.append(tweet.get("conversation_id", None))
+        authors.append(author_id)
+        tweet_urls.append(TWITTER_URL + author_id + "/status/" + tweet_id)
+        texts.append(tweet["text"])
+        timestamps.append(parse_timestamp(tweet["created_at"]))
+        hashtag_col.append(",".join(hashtags) if hashtags else None)
+        mention_col.append(",".join(mentions) if mentions else None)
+        video_col.append(videos)
+        image_col.append(images)
+        url_col.append(",".join(urls))
+
+        metric = tweet["public_metrics"].get
+        likes.append(metric("like_count", 0))
+        replies.append(metric("reply_count", 0))
+        retweets.append(metric("retweet_count", 0))
+        quotes.append(metric("quote_count", 0))
+
+    # Most pages have no geo tagged tweets, only look places up when there are
+    if places:
+        locations = [
+            places.get(tweet["geo"]["place_id"]) if "geo" in tweet else None
+            for tweet in tweets
+        ]
+    else:
+        locations = [None] * len(ids)
+
+    return {
+        "id": ids,
+        "parent_id": parent_ids,
+        "conversation_id": conversation_ids,
+        "author": authors,
+        "url": tweet_urls,
+        "tweet_text": texts,
+        "timestamp": timestamps,
+        "hashtags": hashtag_col,
+        "mentions": mention_col,
+        "videos": video_col,
+        "images": image_col,
+        "urls": url_col,
+        "location": locations,
+        "likes": likes,
+        "replies": replies,
+        "retweets": retweets,
+        "quotes": quotes,
+        # sentiment is filled in once the whole page has been analysed
+        "sentiment": [None] * len(ids),
+        "sentiment_score": [None] * len(ids),
+    }
+
+
+def parse_tweet(tweet: dict, places: dict) -> dict:
+    """parse tweet object into database format
+
+    Args:
+        tweet (dict): tweet object fromt the twitter api
+        places (dict): list of places from the twitter api
+
+    Returns:
+        dict: Custom tweet object
+    """
+    return {key: column[0] for key, column in parse_tweets([tweet], places).items()}
+
+
+def parse_users(users: list) -> Dict[str, list]:
+    """parse a page of user objects into database format
+
+    Args:
+        users (list): user objects from the twitter api
+
+    Returns:
+        dict: Custom user columns, one list per field
+    """
+    ids = []
+    usernames = []
+    names = []
+    verified = []
+    locations = []
+    following = []
+    followers = []
+    dates_joined = []
+    bios = []
+
+    for user in users:
+        public_metrics = user["public_metrics"]
+
+        ids.append(user["id"])
+        usernames.append(user["username"])
+        names.append(user["name"])
+        verified.append(user["verified"])
+        locations.append(user.get("location"))
+        following.append(public_metrics["following_count"])
+        followers.append(public_metrics["followers_count"])
+        dates_joined.append(user["created_at"])
+        bios.append(user["description"])
+
+    return {
+        "id": ids,
+        "username": usernames,
+        "name": names,
+        "verified": verified,
+        "location": locations,
+        "following": following,
+        "followers": followers,
+        "date_joined": dates_joined,
+        "bio": bios,
+    }
+
+
+def parse_user(user: dict) -> dict:
+    """parse user object into database format
+
+    Args:
+        tweet (dict): user object from the twitter api
+
+    Returns:
+        dict: Custom user object
+    """
+    return {key: column[0] for key, column in parse_users([user]).items()}
@@ -1,16 +1,49 @@
-from torch import cuda
+import re
+
+from torch import cuda, nn, qint8
+from torch.quantization import quantize_dynamic
 from transformers import Pipeline, pipeline
 
 device = "cuda" if cuda.is_available() else "cpu"
 
+# Number of tweets passed through the model in a single forward pass
+BATCH_SIZE = 64
+
+# Tweets are short so anything longer than this is truncated
+MAX_LENGTH = 128
+
+# Links and @mentions carry no sentiment and only cost tokenizer time.
+# Hashtags are kept as they are often the words that matter
+NOISE_RE = re.compile(r"https?://\S+|@\w+")
+
 
 class Sentiment:
     """Sentiment Analysis Class"""
 
     sentiment_pipeline: Pipeline
 
-    def __init__(self, model: str) -> None:
-        self.sentiment_pipeline = pipeline("sentiment-analysis", model=model, device=0)
+    def __init__(self, model: str, batch_size: int = BATCH_SIZE) -> None:
+        self.batch_size = batch_size
+        self.sentiment_pipeline = pipeline(
+            "sentiment-analysis",
+            model=model,
+            device=0 if device == "cuda" else -1,
+            batch_size=batch_size,
+            truncation=True,
+            max_length=MAX_LENGTH,
+        )
+
+        # Run the model in half precision on the gpu, or with int8 weights
+        # on the cpu. Classification labels are unaffected in practice
+        if device == "cuda":
+            self.sentiment_pipeline.model.half()
+        else:
+            self.sentiment_pipeline.model = quantize_dynamic(
+                self.sentiment_pipeline.model, {nn.Linear}, dtype=qint8
+            )
 
     def pipe(self, tweets: list) -> list:
-        return self.sentiment_pipeline(tweets)
+        sub = NOISE_RE.sub
+        texts = [sub("", tweet) for tweet in tweets]
+
+        return self.sentiment_pipeline(texts, batch_size=self.batch_size)
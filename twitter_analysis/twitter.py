@@ -1,12 +1,19 @@
-import re
-from datetime import datetime, timedelta
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 from enum import Enum
-from functools import reduce
-from typing import Iterable
+from functools import partial
+from itertools import islice
+from typing import Iterable, Optional
 
-from regex import Match
+import orjson
+from requests.adapters import HTTPAdapter, Retry
 from twarc.client2 import Twarc2
 
+# The parsers moved to twitter_analysis.parse, kept importable from here
+# pylint: disable-next=unused-import
+from twitter_analysis.parse import parse_tweet, parse_user
+
 TWEET_FIELDS = [
     "attachments",
     "author_id",
@@ -56,6 +63,31 @@ USER_FIELDS = [
     "withheld",
 ]
 
+# The api takes the fields as comma separated strings
+_TWEET_FIELDS_STR = ",".join(TWEET_FIELDS)
+_PLACE_FIELDS_STR = ",".join(PLACE_FIELDS)
+_USER_FIELDS_STR = ",".join(USER_FIELDS)
+_EXPANSIONS_STR = ",".join(EXPANSIONS)
+
+# Shared by every page without places, never modified
+_NO_PLACES = {}
+
+# Placeholder for the default `search` bounds, which depend on when it's called
+_DEFAULT_BOUND = object()
+
+# Minimum number of seconds between the start of two api requests
+REQUEST_INTERVAL = 1.05
+
+
+def _page_places(page: dict) -> dict:
+    """Map the place ids of an api page to their full names"""
+    # most pages have no geo tagged tweets
+    places = page["includes"].get("places")
+    if not places:
+        return _NO_PLACES
+
+    return {place["id"]: place["full_name"] for place in places}
+
 
 class SearchMethod(Enum):
     ALL = "all"
@@ -66,168 +98,124 @@ class TwitterApiV2(Twarc2):
     """Twitter API V2. based on twarc"""
 
     def __init__(self, token) -> None:
+        self._request_lock = threading.Lock()
+        self._last_request = 0.0
         super().__init__(bearer_token=token)
 
+    def get(self, *args, **kwargs):
+        """Make a GET request, at most one every REQUEST_INTERVAL seconds
+
+        Replies are fetched from several threads, and the full archive search
+        only allows one request per second per app. Going over it makes twarc
+        wait for the whole rate limit window to reset.
+        """
+        with self._request_lock:
+            wait = self._last_request + REQUEST_INTERVAL - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._last_request = time.monotonic()
+
+        response = super().get(*args, **kwargs)
+        # twarc decodes every page with response.json(), orjson is a lot
+        # faster than the stdlib json module on these payloads
+        response.json = partial(orjson.loads, response.content)
+
+        return response
+
+    def connect(self):
+        """Open the twarc http session with a keepalive connection pool
+
+        Failed connection attempts are retried by the adapter rather than
+        twarc tearing down the whole session. Rate limits and server errors
+        are still left to twarc.
+        """
+        super().connect()
+        retries = Retry(total=3, read=0, status=0, backoff_factor=0.5)
+        self.client.mount(
+            "https://",
+            HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retries),
+        )
+
     def tweet_lookup(self, tweet_ids: list) -> Iterable:
         results = super().tweet_lookup(
             tweet_ids,
-            tweet_fields=",".join(TWEET_FIELDS),
-            place_fields=",".join(PLACE_FIELDS),
-            user_fields=",".join(USER_FIELDS),
-            expansions=",".join(EXPANSIONS),
+            tweet_fields=_TWEET_FIELDS_STR,
+            place_fields=_PLACE_FIELDS_STR,
+            user_fields=_USER_FIELDS_STR,
+            expansions=_EXPANSIONS_STR,
         )
         # yield results page by page
         for page in results:
             tweets = page["data"]
             users = page["includes"]["users"]
-            places = {
-                place["id"]: place["full_name"]
-                for place in page["includes"].get("places", [])
-            }
 
-            yield tweets, users, places
+            yield tweets, users, _page_places(page)
 
     def user_lookup(self, users, usernames=False):
         return super().user_lookup(
             users,
             usernames,
-            user_fields=",".join(USER_FIELDS),
+            user_fields=_USER_FIELDS_STR,
         )
 
     def search(
         self,
         query: str,
-        start: datetime = datetime.now() - timedelta(days=7),
-        end: datetime = datetime.now() - timedelta(days=1),
+        start: Optional[datetime] = _DEFAULT_BOUND,
+        end: Optional[datetime] = _DEFAULT_BOUND,
         limit: int = None,
         method: SearchMethod = SearchMethod.ALL,
+        *,
+        since_id: Optional[int] = None,
+        max_pages: Optional[int] = None,
     ):
+        # Unless given, search from a week ago until yesterday. None means
+        # no bound at all
+        now = datetime.now(timezone.utc)
+        if start is _DEFAULT_BOUND:
+            start = now - timedelta(days=7)
+        if end is _DEFAULT_BOUND:
+            end = now - timedelta(days=1)
+
         # Max results per page is 500 with academic key or 100 with regular
         max_batch = 500 if method == SearchMethod.ALL else 100
+        page_size = max_batch if not limit or limit > max_batch else limit
 
         search_results = self.search_all(
             query=query,
+            since_id=since_id,
             start_time=start,
             end_time=end,
-            max_results=max_batch if not limit or limit > max_batch else limit,
-            tweet_fields=",".join(TWEET_FIELDS),
-            place_fields=",".join(PLACE_FIELDS),
-            user_fields=",".join(USER_FIELDS),
-            expansions=",".join(EXPANSIONS),
+            max_results=page_size,
+            tweet_fields=_TWEET_FIELDS_STR,
+            place_fields=_PLACE_FIELDS_STR,
+            user_fields=_USER_FIELDS_STR,
+            expansions=_EXPANSIONS_STR,
         )
 
-        # yield results page by page
-        for page in search_results:
+        # yield results page by page until there are `limit` tweets or
+        # `max_pages` pages. twarc only requests the next page when asked for
+        # it so stopping here saves the extra call
+        count = 0
+        for page in islice(search_results, max_pages):
             tweets = page["data"]
+            if limit:
+                # pages aren't always full, only the last one is cut short
+                tweets = tweets[: limit - count]
+                count += len(tweets)
             users = page["includes"]["users"]
-            places = {
-                place["id"]: place["full_name"]
-                for place in page["includes"].get("places", [])
-            }
 
-            yield tweets, users, places
+            yield tweets, users, _page_places(page)
+
+            if limit and count >= limit:
+                break
 
     def search_replies(self, conversation_id: int):
+        # Tweet ids increase over time so replies always come after the
+        # conversation's first tweet, no need to search the archive before it
         return self.search(
             query=f"conversation_id:{str(conversation_id)} is:reply",
             start=None,
             end=None,
+            since_id=conversation_id,
         )
-
-
-def parse_tweet(tweet: dict, places: dict) -> dict:
-    """parse tweet object into database format
-
-    Args:
-        tweet (dict): tweet object fromt the twitter api
-        places (dict): list of places from the twitter api
-
-    Returns:
-        dict: Custom tweet object
-    """
-    hashtags = []
-    mentions = []
-    urls = []
-    location = None
-
-    public_metrics = tweet["public_metrics"]
-
-    if "entities" in tweet:
-        hashtags = [hashtag["tag"] for hashtag in tweet["entities"].get("hashtags", [])]
-        mentions = [
-            mention["username"] for mention in tweet["entities"].get("mentions", [])
-        ]
-        urls = [url["expanded_url"] for url in tweet["entities"].get("urls", [])]
-
-    if "geo" in tweet:
-        location = places.get(tweet["geo"]["place_id"])
-
-    # get the number of photos and videos from the urls
-    r = re.compile(r"^https://twitter.com/\w{1,15}/.*/(video|photo)/1")
-
-    def photo_video(a, b: Match):
-        photos, videos = a
-        if b:
-            g = b.group(1)
-            return (
-                photos + 1 if g == "photo" else photos,
-                videos + 1 if g == "video" else videos,
-            )
-        else:
-            return a
-
-    images, videos = reduce(photo_video, [r.search(u) for u in urls], (0, 0))
-
-    referenced_tweet = (
-        [
-            i["id"]
-            for i in tweet.get("referenced_tweets", [{"type": None}])
-            if i["type"] == "replied_to"
-        ]
-        or [None]
-    )[0]
-
-    return {
-        "id": tweet["id"],
-        "parent_id": referenced_tweet,
-        "conversation_id": tweet.get("conversation_id", None),
-        "author": tweet["author_id"],
-        "url": f"https://twitter.com/{tweet['author_id']}/status/{tweet['id']}",
-        "tweet_text": tweet["text"],
-        "timestamp": tweet["created_at"],
-        "hashtags": ",".join(hashtags) or None,
-        "mentions": ",".join(mentions) or None,
-        "videos": videos,
-        "images": images,
-        "urls": ",".join(urls),
-        "location": location,
-        "likes": public_metrics.get("like_count", 0),
-        "replies": public_metrics.get("reply_count", 0),
-        "retweets": public_metrics.get("retweet_count", 0),
-        "quotes": public_metrics.get("quote_count", 0),
-        "sentiment": None,
-        "sentiment_score": None,
-    }
-
-
-def parse_user(user: dict) -> dict:
-    """parse user object into database format
-
-    Args:
-        tweet (dict): user object from the twitter api
-
-    Returns:
-        dict: Custom user object
-    """
-    public_metrics = user["public_metrics"]
-    return {
-        "id": user["id"],
-        "username": user["username"],
-        "name": user["name"],
-        "verified": user["verified"],
-        "location": user.get("location"),
-        "following": public_metrics["following_count"],
-        "followers": public_metrics["followers_count"],
-        "date_joined": user["created_at"],
-        "bio": user["description"],
-    }